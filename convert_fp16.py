@@ -0,0 +1,41 @@
+"""
+Convert a rembg ONNX model to FP16 for the CUDA/TensorRT providers.
+
+Inputs and outputs stay FP32 and Sigmoid/Softmax nodes are kept in FP32,
+which avoids ghosting in the mask from FP16 saturation. Run fix_shapes.py
+first and pass its output to get <model>_fixed_fp16.onnx.
+
+Usage:
+    python convert_fp16.py [--model ~/.u2net/u2netp_fixed.onnx]
+"""
+import argparse
+import os
+
+import onnx
+from onnxconverter_common import float16
+
+FP32_OPS = ["Sigmoid", "Softmax"]
+
+
+def main():
+    u2net_home = os.path.expanduser(os.environ.get("U2NET_HOME", "~/.u2net"))
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.path.join(u2net_home, "u2netp.onnx"))
+    parser.add_argument("--output", help="Defaults to <model>_fp16.onnx")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + "_fp16.onnx"
+
+    model = onnx.load(args.model)
+    model_fp16 = float16.convert_float_to_float16(
+        model,
+        keep_io_types=True,
+        op_block_list=float16.DEFAULT_OP_BLOCK_LIST + FP32_OPS,
+    )
+    onnx.save(model_fp16, output)
+    print(f"Saved FP16 model to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Freeze a rembg ONNX model's input height and width to the size rembg feeds it.
+
+rembg always runs u2net/u2netp at 320x320 and isnet at 1024x1024. With the
+spatial dims fixed, ORT can constant-fold shape arithmetic and pick
+shape-specialized kernels. The batch dim stays dynamic so the batch
+endpoint can still run several images in one call.
+Requires the onnx and sympy packages.
+
+Run it before convert_fp16.py or quantize.py and point those at the
+<model>_fixed.onnx it writes, so the server picks up <model>_fixed_fp16.onnx
+or <model>_fixed_int8.onnx.
+
+Usage:
+    python fix_shapes.py [--model ~/.u2net/u2netp.onnx] [--size 320]
+"""
+import argparse
+import os
+
+import onnx
+from onnxruntime.tools.onnx_model_utils import make_dim_param_fixed, remove_invalid_dim_values
+from onnxruntime.tools.symbolic_shape_infer import SymbolicShapeInference
+
+
+def main():
+    u2net_home = os.path.expanduser(os.environ.get("U2NET_HOME", "~/.u2net"))
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.path.join(u2net_home, "u2netp.onnx"))
+    parser.add_argument("--size", type=int, default=320, help="1024 for isnet-general-use")
+    parser.add_argument("--output", help="Defaults to <model>_fixed.onnx")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + "_fixed.onnx"
+
+    model = onnx.load(args.model)
+    remove_invalid_dim_values(model.graph)
+    model_input = model.graph.input[0]
+
+    # NCHW: fix H and W only, leave N alone
+    for dim in model_input.type.tensor_type.shape.dim[2:]:
+        if dim.HasField("dim_param"):
+            # Also replaces the symbol everywhere else it appears in the graph
+            make_dim_param_fixed(model.graph, dim.dim_param, args.size)
+        else:
+            dim.dim_value = args.size
+    model = SymbolicShapeInference.infer_shapes(model, auto_merge=True)
+
+    onnx.save(model, output)
+    print(f"Saved model with input {model_input.name} fixed to Nx3x{args.size}x{args.size} to {output}")
+
+
+if __name__ == "__main__":
+    main()
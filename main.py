@@ -1,20 +1,92 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+import os
+
+# Must be set before numpy/onnxruntime load their threading runtimes. ORT's
+# own pools are sized in session_options(); keep OpenMP from adding more.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OMP_PROC_BIND", "close")
+os.environ.setdefault("OMP_PLACES", "cores")
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import ctypes
+import fcntl
 import io
 import logging
-import os
-from PIL import Image
+import threading
+import uuid
+from typing import List
+import numpy as np
+import orjson
+from blake3 import blake3
+from cachetools import LRUCache
+from PIL import Image, ImageOps
+
+# Bytes per pixel written by the raw encoder, for modes with a fixed layout
+_RAW_PIXEL_SIZE = {"L": 1, "P": 1, "LA": 2, "RGB": 3, "RGBA": 4, "CMYK": 4, "I": 4, "F": 4}
+_pil_tobytes = Image.Image.tobytes
+
+def _tobytes_single_chunk(self, encoder_name="raw", *args):
+    """Image.tobytes that encodes raw pixels into one exact-size buffer
+
+    Pillow's version encodes in 64KB chunks and joins them, which needs twice
+    the memory and is slower on large images. np.asarray(img) goes through
+    tobytes, so this covers rembg's preprocessing too.
+    """
+    pixel_size = _RAW_PIXEL_SIZE.get(self.mode)
+    if encoder_name != "raw" or args or pixel_size is None:
+        return _pil_tobytes(self, encoder_name, *args)
+
+    self.load()
+    if self.width == 0 or self.height == 0:
+        return b""
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+    e = Image._getencoder(self.mode, "raw", self.mode)
+    e.setimage(self.im)
+    _, errcode, data = e.encode(self.width * self.height * pixel_size)
+    if errcode != 1:
+        # Encoder didn't finish in one pass, use Pillow's chunked loop
+        return _pil_tobytes(self, encoder_name, *args)
+    return data
+
+Image.Image.tobytes = _tobytes_single_chunk
+
+# Optional libspng encoder (pip install pyspng-seekable)
+try:
+    import pyspng
+except ImportError:
+    pyspng = None
+
+# Configure logging (LOG_LEVEL=WARNING silences the per-request logs)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+INVALID_LOG_LEVEL = not isinstance(logging.getLevelName(LOG_LEVEL), int)
+if INVALID_LOG_LEVEL:
+    LOG_LEVEL = "INFO"
+logging.basicConfig(
+    level=LOG_LEVEL,
+    handlers=[logging.StreamHandler()],
+    force=True,
+)
 logger = logging.getLogger(__name__)
+if INVALID_LOG_LEVEL:
+    logger.error(f"Unknown LOG_LEVEL {os.environ['LOG_LEVEL']!r}, using INFO")
+
+class _ProbeAccessFilter(logging.Filter):
+    """Drop access log lines for the health probe endpoints"""
+
+    def filter(self, record):
+        # uvicorn access records: (client, method, path, http_version, status)
+        return not (record.args and len(record.args) > 2 and record.args[2] in ("/", "/health"))
+
+logging.getLogger("uvicorn.access").addFilter(_ProbeAccessFilter())
 
 # Create FastAPI app
 app = FastAPI(
     title="Background Removal API",
     description="API for removing backgrounds from images using AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -26,55 +98,484 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Lazy import for rembg
-_rembg_loaded = False
+# Models selectable per request. u2netp is a 4.7MB version of u2net with
+# close quality on general images, isnet-general-use is the high quality option.
+SUPPORTED_MODELS = ("u2netp", "u2net", "isnet-general-use")
+DEFAULT_MODEL = os.environ.get("REMBG_MODEL", "u2netp")
+if DEFAULT_MODEL not in SUPPORTED_MODELS:
+    logger.error(f"Unsupported REMBG_MODEL {DEFAULT_MODEL!r}, falling back to u2netp")
+    DEFAULT_MODEL = "u2netp"
+
+# Persistent rembg sessions by model name; the default one is created at startup.
+# One lock per model, so loading a model doesn't hold up requests for the others.
+SESSIONS = {}
+_session_locks = {model: threading.Lock() for model in SUPPORTED_MODELS}
+_rembg_lock = threading.Lock()
 _rembg_remove = None
 
-def get_rembg():
-    """Lazy load rembg to avoid startup delays"""
-    global _rembg_loaded, _rembg_remove
-    if not _rembg_loaded:
-        try:
-            logger.info("Loading rembg library...")
-            from rembg import remove as rembg_remove
-            _rembg_remove = rembg_remove
-            _rembg_loaded = True
-            logger.info("rembg loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load rembg: {e}")
-            raise HTTPException(status_code=500, detail="Background removal service unavailable")
-    return _rembg_remove
+# Where ORT/OpenVINO keep optimized models between restarts
+ORT_CACHE_DIR = os.environ.get("ORT_CACHE_DIR", "/tmp")
+
+# Execution providers in order of preference (unavailable ones are skipped)
+PROVIDERS = [
+    ("TensorrtExecutionProvider", {
+        "trt_fp16_enable": True,
+        "trt_engine_cache_enable": True,
+        "trt_engine_cache_path": os.path.join(ORT_CACHE_DIR, "trt_cache"),
+    }),
+    "CUDAExecutionProvider",
+    ("OpenVINOExecutionProvider", {"cache_dir": os.path.join(ORT_CACHE_DIR, "ov_cache")}),
+    "CPUExecutionProvider",
+]
+
+# ORT threads per inference and number of concurrent inferences, sized
+# together (and split across gunicorn workers) so they don't oversubscribe the CPU
+CPU_COUNT = os.cpu_count() or 1
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+CPUS_PER_WORKER = max(1, CPU_COUNT // WEB_CONCURRENCY)
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", min(4, CPUS_PER_WORKER)))
+MAX_CONCURRENT_INFERENCES = max(1, CPUS_PER_WORKER // ORT_INTRA_OP_THREADS)
+inference_semaphore = asyncio.Semaphore(MAX_CONCURRENT_INFERENCES)
+
+def cpu_supports_vnni():
+    """Check whether the CPU has AVX-512 VNNI for fast INT8 inference"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            return "avx512_vnni" in f.read()
+    except OSError:
+        return False
+
+def session_options():
+    """ORT session options with full graph optimization"""
+    import onnxruntime as ort
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    sess_opts.enable_mem_pattern = True
+    sess_opts.enable_cpu_mem_arena = True
+    sess_opts.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    # Sequential execution never uses the inter-op pool
+    sess_opts.inter_op_num_threads = 1
+    return sess_opts
+
+def available_providers():
+    """PROVIDERS filtered down to what this onnxruntime build supports"""
+    import onnxruntime as ort
+
+    available = ort.get_available_providers()
+    return [p for p in PROVIDERS if (p[0] if isinstance(p, tuple) else p) in available]
+
+def cached_inference_session(model_path, sess_opts, providers):
+    """Create an InferenceSession, reusing the graph optimized on a previous boot
+
+    Only used on the plain CPU EP, models with nodes compiled by other EPs
+    can't be serialized. The cache name includes the source model's size and
+    mtime so a replaced model is never matched with a stale graph.
+    """
+    import onnxruntime as ort
+
+    stat = os.stat(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    optimized_path = os.path.join(
+        ORT_CACHE_DIR, f"{name}-{stat.st_size}-{int(stat.st_mtime)}.opt.onnx"
+    )
+
+    # Workers start together; the first one writes the cache, the rest wait and load it
+    with open(optimized_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(optimized_path):
+            # Already optimized for this host's CPU EP, don't run the transformers again
+            sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(optimized_path, sess_options=sess_opts, providers=providers)
+
+        tmp_path = f"{optimized_path}.{os.getpid()}.tmp"
+        sess_opts.optimized_model_filepath = tmp_path
+        inner_session = ort.InferenceSession(model_path, sess_options=sess_opts, providers=providers)
+        os.replace(tmp_path, optimized_path)
+        return inner_session
+
+def create_session(model_name):
+    """Create a rembg session, preferring slimmed, fixed-shape, FP16 or INT8 variants when present"""
+    import onnxruntime as ort
+    from rembg.sessions import sessions_class
+
+    session_class = next(sc for sc in sessions_class if sc.name() == model_name)
+    model_path = str(session_class.download_models())
+    model_base = os.path.splitext(model_path)[0]
+
+    # onnxruntime-gpu lists the CUDA EP even without a GPU, so look for the device
+    cpu_only = not os.path.exists("/dev/nvidiactl")
+
+    # Each offline step appends its suffix to the model it was given, so the
+    # supported pipeline onnxslim -> fix_shapes.py -> convert_fp16.py or
+    # quantize.py yields e.g. u2netp.slim_fixed_fp16.onnx; take every step found
+    for suffix, applies, kind in (
+        (".slim", True, "slimmed"),
+        ("_fixed", True, "fixed-shape"),
+        # FP16 for tensor cores, INT8 for VNNI CPUs
+        ("_fp16", not cpu_only, "FP16"),
+        ("_int8", cpu_only and model_name in ("u2net", "u2netp") and cpu_supports_vnni(), "INT8"),
+    ):
+        if applies and os.path.exists(model_base + suffix + ".onnx"):
+            model_base += suffix
+            logger.info(f"Using {kind} model: {model_base}.onnx")
+    model_path = model_base + ".onnx"
+
+    sess_opts = session_options()
+    providers = available_providers()
+    if cpu_only:
+        # Don't even try to set up TensorRT/CUDA without a GPU
+        providers = [
+            p for p in providers
+            if (p[0] if isinstance(p, tuple) else p) in ("OpenVINOExecutionProvider", "CPUExecutionProvider")
+        ]
+
+    # Bypass rembg's factory so our options and provider options reach ORT;
+    # the session object only needs what rembg's predict() uses
+    session = session_class.__new__(session_class)
+    session.model_name = session_class.name()
+    session.providers = providers
+    if providers == ["CPUExecutionProvider"]:
+        session.inner_session = cached_inference_session(model_path, sess_opts, providers)
+    else:
+        session.inner_session = ort.InferenceSession(model_path, sess_options=sess_opts, providers=providers)
+    return session
+
+def get_rembg(model_name):
+    """Return the rembg remove function and the session for a model, creating either on first use
+
+    Startup loads both for the default model, but if that failed (e.g. a
+    download blip) this retries on each request instead of failing until restart.
+    """
+    global _rembg_remove
+    if _rembg_remove is None:
+        with _rembg_lock:
+            if _rembg_remove is None:
+                try:
+                    from rembg.bg import remove
+                    _rembg_remove = remove
+                except Exception as e:
+                    logger.error(f"Failed to load rembg: {e}")
+                    raise HTTPException(status_code=500, detail="Background removal service unavailable")
+
+    # Checked again under the lock, in case another request just created it
+    session = SESSIONS.get(model_name)
+    if session is None:
+        with _session_locks[model_name]:
+            session = SESSIONS.get(model_name)
+            if session is None:
+                try:
+                    session = SESSIONS[model_name] = create_session(model_name)
+                except Exception as e:
+                    logger.error(f"Failed to load model {model_name}: {e}")
+                    raise HTTPException(status_code=500, detail="Background removal service unavailable")
+    return _rembg_remove, session
+
+# Upload limits
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+async def read_upload(file):
+    """Read the upload in chunks, rejecting it as soon as it exceeds the size limit"""
+    buf = bytearray()
+    while True:
+        chunk = await file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf.extend(chunk)
+        if len(buf) > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail="File too large. Maximum size is 50MB"
+            )
+    return bytes(buf)
+
+# zlib level for output PNGs: level 1 is several times faster than the
+# default 6 for slightly larger files
+PNG_COMPRESS_LEVEL = 1
+
+def encode_png(img):
+    """Encode an image as PNG, using libspng when available"""
+    if pyspng is not None:
+        return pyspng.encode(np.asarray(img), compress_level=PNG_COMPRESS_LEVEL)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    return buf.getvalue()
+
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"\xff\xd8\xff": "JPEG",
+    b"RIFF": "WEBP",
+    b"BM": "BMP",
+    b"GIF8": "GIF",
+    b"II*\x00": "TIFF",
+    b"MM\x00*": "TIFF",
+}
+
+def sniff_image_format(content):
+    """Identify the image format from its magic bytes, without decoding it"""
+    image_format = next(
+        (fmt for magic, fmt in IMAGE_SIGNATURES.items() if content.startswith(magic)),
+        None,
+    )
+    # RIFF is also used by WAV/AVI
+    if image_format == "WEBP" and content[8:12] != b"WEBP":
+        return None
+    return image_format
+
+# glibc keeps freed heap pages around; malloc_trim hands them back to the OS.
+# Not needed (and a no-op) when start.sh preloads jemalloc instead.
+_malloc_trim = None
+if "jemalloc" not in os.environ.get("LD_PRELOAD", ""):
+    try:
+        _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError):
+        pass
+
+# Output PNGs of recent uploads keyed by (model, BLAKE3 of the upload), so
+# retries and double submits skip inference. Bounded by total bytes, per
+# worker: total memory is RESULT_CACHE_MAX_BYTES * WEB_CONCURRENCY.
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+result_cache = LRUCache(maxsize=RESULT_CACHE_MAX_BYTES, getsizeof=len)
+
+# Longest edge fed to rembg; u2net works at 320x320 internally anyway
+MAX_INPUT_EDGE = 1024
+
+def letterbox(img):
+    """Pad an image to a square of its longest edge
+
+    rembg stretches its input to the model's square input size, so padding
+    first keeps the aspect ratio. Returns the padded image and the box to
+    crop the result back with.
+    """
+    size = max(img.size)
+    padded = Image.new("RGB", (size, size))
+    padded.paste(img, (0, 0))
+    return padded, (0, 0) + img.size
+
+# Decode failures that mean a bad upload rather than a server error:
+# unidentified or truncated files (OSError) and decompression bombs
+INVALID_IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+
+class InvalidImageError(Exception):
+    """An upload that can't be decoded, reported as a 400"""
+
+def open_image(content):
+    """Open an upload, reading only its header"""
+    try:
+        return Image.open(io.BytesIO(content))
+    except INVALID_IMAGE_ERRORS as e:
+        raise InvalidImageError(e) from e
+
+def decode_image(img):
+    """Decode an opened upload, applying its EXIF orientation like rembg does
+
+    Pixels are loaded here so truncated files fail now, not later in
+    inference or encoding where an OSError is a server error.
+    """
+    try:
+        img.load()
+        return ImageOps.exif_transpose(img)
+    except INVALID_IMAGE_ERRORS as e:
+        raise InvalidImageError(e) from e
+
+def apply_mask(img, mask):
+    """Cut the image out with a full-resolution mask and encode it as PNG
+
+    The mask is stacked on as the alpha channel in one numpy step, leaving
+    the color channels untouched (Image.composite also darkened them).
+    """
+    alpha = np.asarray(mask)
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        # Keep the upload's own transparency
+        img = img.convert("RGBA")
+        source_alpha = np.asarray(img.getchannel("A"), dtype=np.uint16)
+        alpha = (source_alpha * alpha // 255).astype(np.uint8)
+
+    rgba = np.dstack((np.asarray(img.convert("RGB")), alpha))
+    return encode_png(Image.fromarray(rgba, "RGBA"))
+
+# Resampling used to bring masks back up to the upload's resolution, shared
+# by both endpoints so the same image gets the same cutout from each
+MASK_RESAMPLE = Image.BILINEAR
+
+def process_image(content, rembg_remove, session):
+    """Decode once, run rembg on a downscaled copy and apply the upscaled mask to the original"""
+    img = decode_image(open_image(content))
+    original_size = img.size
+
+    # Downscale large uploads before handing them to rembg
+    scale = min(1.0, MAX_INPUT_EDGE / max(original_size))
+    small = img.convert("RGB")
+    if scale < 1.0:
+        small = small.resize(
+            (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale))),
+            Image.LANCZOS,
+        )
+    small, box = letterbox(small)
+
+    # Hand rembg the PIL image directly: no PNG round-trip on the way in,
+    # and the mask comes back as a PIL image instead of encoded bytes
+    mask = rembg_remove(small, session=session, only_mask=True)
+
+    # Crop the padding off, then upscale only the alpha mask back to the
+    # original resolution
+    mask = mask.convert("L").crop(box)
+    if mask.size != original_size:
+        mask = mask.resize(original_size, MASK_RESAMPLE)
+
+    return apply_mask(img, mask)
+
+# Preprocessing of each model as done by its rembg session: (mean, std, input size).
+# Copied from the rembg version pinned in requirements.txt (isnet's mean changed
+# in 2.0.67); test_predict_masks.py checks them against session.predict().
+MODEL_INPUTS = {
+    "u2netp": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), 1024),
+}
+MAX_BATCH_SIZE = 8
+# Images per ORT run for each model. Activations grow with the batch, and one
+# isnet image at 1024x1024 already takes GBs, so larger batches run in chunks.
+MAX_RUN_BATCH = {
+    "u2netp": 8,
+    "u2net": 2,
+    "isnet-general-use": 1,
+}
+# Combined limits for one batch, so a full batch of large uploads can't
+# exhaust memory when decoded and masked together
+MAX_BATCH_TOTAL_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_BATCH_PIXELS = 64 * 1024 * 1024  # 64 megapixels
+
+def predict_masks(session, images, model_name):
+    """Run a batch of images through the ORT session in one call
+
+    Mirrors rembg's per-image normalize/predict, but letterboxes every image
+    to the model input size and stacks them so the session runs once.
+    """
+    mean, std, size = MODEL_INPUTS[model_name]
+
+    batch = np.empty((len(images), size, size, 3), dtype=np.float32)
+    boxes = []
+    for i, img in enumerate(images):
+        scale = size / max(img.size)
+        w, h = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+        padded = Image.new("RGB", (size, size))
+        padded.paste(img.convert("RGB").resize((w, h), Image.LANCZOS), (0, 0))
+        batch[i] = np.asarray(padded)
+        boxes.append((0, 0, w, h))
+
+    batch /= np.maximum(batch.max(axis=(1, 2, 3), keepdims=True), 1.0)
+    batch -= np.array(mean, dtype=np.float32)
+    batch /= np.array(std, dtype=np.float32)
+    batch = np.ascontiguousarray(batch.transpose((0, 3, 1, 2)))
+
+    # Run in chunks of the model's batch limit, or of its fixed batch dimension
+    model_input = session.inner_session.get_inputs()[0]
+    step = model_input.shape[0] if isinstance(model_input.shape[0], int) else MAX_RUN_BATCH[model_name]
+    preds = np.concatenate([
+        session.inner_session.run(None, {model_input.name: batch[i:i + step]})[0][:, 0]
+        for i in range(0, len(images), step)
+    ])
+
+    # Per-image min/max scaling to 0-255, vectorized over the batch
+    mi = preds.min(axis=(1, 2), keepdims=True)
+    ma = preds.max(axis=(1, 2), keepdims=True)
+    masks = ((preds - mi) / np.maximum(ma - mi, 1e-8) * 255).astype(np.uint8)
+
+    return [Image.fromarray(m, mode="L").crop(box) for m, box in zip(masks, boxes)]
+
+def process_batch(contents, session, model_name):
+    """Remove the background from several uploads with a single inference call"""
+    # Image.open only reads headers, so check the combined size before decoding
+    opened = [open_image(content) for content in contents]
+    if sum(img.width * img.height for img in opened) > MAX_BATCH_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large. Maximum is {MAX_BATCH_PIXELS // (1024 * 1024)} megapixels in total"
+        )
+
+    images = [decode_image(img) for img in opened]
+    masks = predict_masks(session, images, model_name)
+    return [
+        apply_mask(img, mask.resize(img.size, MASK_RESAMPLE))
+        for img, mask in zip(images, masks)
+    ]
+
+def multipart_mixed(parts):
+    """Build a multipart/mixed body from (filename, PNG bytes) pairs"""
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for filename, data in parts:
+        # Client-supplied name: no line breaks, quotes and backslashes escaped
+        filename = filename.replace("\r", "").replace("\n", "")
+        filename = filename.replace("\\", "\\\\").replace('"', '\\"')
+        body += (
+            f"--{boundary}\r\n"
+            "Content-Type: image/png\r\n"
+            f'Content-Disposition: attachment; filename="{filename}"\r\n'
+            f"Content-Length: {len(data)}\r\n\r\n"
+        ).encode()
+        body += data
+        body += b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return bytes(body), f"multipart/mixed; boundary={boundary}"
 
 @app.on_event("startup")
 async def startup_event():
+    global _rembg_remove
     logger.info("Background Removal API is starting up...")
+    try:
+        logger.info(f"Loading rembg session for {DEFAULT_MODEL}...")
+        from rembg.bg import remove
+        session = create_session(DEFAULT_MODEL)
+        SESSIONS[DEFAULT_MODEL] = session
+        logger.info(f"rembg session ready, providers: {session.inner_session.get_providers()}")
+
+        # Warm up the session so the first request doesn't pay for it
+        remove(Image.new("RGB", (320, 320), (127, 127, 127)), session=session)
+        _rembg_remove = remove
+        logger.info("rembg session warmed up")
+    except Exception as e:
+        logger.error(f"Failed to load rembg: {e}")
+
+# Static response bodies, serialized once at import
+ROOT_BODY = orjson.dumps({
+    "message": "Background Removal API is running!",
+    "status": "healthy",
+    "version": "1.0.0",
+    "docs": "/docs",
+    "health": "/health"
+})
+HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "background-removal-api"})
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {
-        "message": "Background Removal API is running!",
-        "status": "healthy",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "health": "/health"
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return {"status": "healthy", "service": "background-removal-api"}
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 @app.post("/remove-background")
-async def remove_background(file: UploadFile = File(...)):
+async def remove_background(
+    file: UploadFile = File(...),
+    model: str = Query(DEFAULT_MODEL, description=f"Model to use: {', '.join(SUPPORTED_MODELS)}"),
+):
     """
     Remove background from uploaded image
     
     - **file**: Image file to process (JPG, PNG, etc.)
+    - **model**: Segmentation model (u2netp, u2net, isnet-general-use)
     
     Returns the processed image with transparent background as PNG
     """
-    logger.info(f"Processing file: {file.filename}, content_type: {file.content_type}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Processing file: %s, content_type: %s", file.filename, file.content_type)
     
     # Validate file type
     if not file.content_type or not file.content_type.startswith('image/'):
@@ -83,14 +584,15 @@ async def remove_background(file: UploadFile = File(...)):
             detail="File must be an image (JPG, PNG, etc.)"
         )
     
-    # Validate file size (50MB limit)
-    content = await file.read()
-    if len(content) > 50 * 1024 * 1024:  # 50MB
+    if model not in SUPPORTED_MODELS:
         raise HTTPException(
-            status_code=413, 
-            detail="File too large. Maximum size is 50MB"
+            status_code=400,
+            detail=f"Unknown model. Choose one of: {', '.join(SUPPORTED_MODELS)}"
         )
     
+    # Validate file size (50MB limit) while reading
+    content = await read_upload(file)
+    
     if len(content) == 0:
         raise HTTPException(
             status_code=400,
@@ -100,28 +602,51 @@ async def remove_background(file: UploadFile = File(...)):
     try:
         logger.info("Starting background removal process...")
         
-        # Get rembg function (lazy loaded)
-        rembg_remove = get_rembg()
-        
-        # Validate image with PIL
-        try:
-            with Image.open(io.BytesIO(content)) as img:
-                logger.info(f"Image validated: {img.format}, {img.size}, {img.mode}")
-        except Exception as e:
-            logger.error(f"Invalid image file: {e}")
+        # Validate image by its signature; it is only decoded once, in the worker
+        image_format = sniff_image_format(content)
+        if image_format is None:
+            logger.error("Invalid image file: unrecognized signature")
             raise HTTPException(
                 status_code=400,
                 detail="Invalid image file. Please upload a valid image."
             )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Image validated: %s, %d bytes", image_format, len(content))
         
-        # Process the image with rembg - force raw bytes
-        output_bytes = rembg_remove(content, force_return_bytes=True)
-        
-        logger.info("Background removal completed successfully")
+        # Checked before get_rembg, so a cached retry never loads a model
+        cache_key = (model, blake3(content).digest())
+        output_bytes = result_cache.get(cache_key)
+        if output_bytes is not None:
+            logger.info("Returning cached result")
+        else:
+            # Get rembg function and the persistent session (may load the model)
+            rembg_remove, session = await asyncio.to_thread(get_rembg, model)
+            
+            # Process the image with rembg at reduced resolution, off the event loop
+            async with inference_semaphore:
+                try:
+                    output_bytes = await asyncio.to_thread(process_image, content, rembg_remove, session)
+                except InvalidImageError as e:
+                    logger.error("Invalid image file: %s", e)
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Invalid image file. Please upload a valid image."
+                    )
+            
+            # Results larger than the whole cache are simply not stored
+            if len(output_bytes) <= RESULT_CACHE_MAX_BYTES:
+                result_cache[cache_key] = output_bytes
+            logger.info("Background removal completed successfully")
+            
+            # Drop the upload and return the decode buffers' pages to the OS
+            # instead of keeping them in the heap while the response is sent
+            del content
+            if _malloc_trim is not None:
+                await asyncio.to_thread(_malloc_trim, 0)
         
         # Return the processed image
-        return StreamingResponse(
-            io.BytesIO(output_bytes), 
+        return Response(
+            content=output_bytes,
             media_type="image/png",
             headers={
                 "Content-Disposition": f"attachment; filename=no_bg_{file.filename or 'image'}.png"
@@ -132,12 +657,97 @@ async def remove_background(file: UploadFile = File(...)):
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
+        logger.error("Error processing image: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Error processing image: {str(e)}"
         )
 
+@app.post("/remove-background-batch")
+async def remove_background_batch(
+    files: List[UploadFile] = File(...),
+    model: str = Query(DEFAULT_MODEL, description=f"Model to use: {', '.join(SUPPORTED_MODELS)}"),
+):
+    """
+    Remove background from several uploaded images in one inference call
+    
+    - **files**: Image files to process (JPG, PNG, etc.), up to 8
+    - **model**: Segmentation model (u2netp, u2net, isnet-general-use)
+    
+    Returns the processed images as PNG parts of a multipart/mixed response
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Processing batch of %d files", len(files))
+    
+    if len(files) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum batch size is {MAX_BATCH_SIZE}"
+        )
+    
+    if model not in SUPPORTED_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown model. Choose one of: {', '.join(SUPPORTED_MODELS)}"
+        )
+    
+    contents = []
+    total_size = 0
+    for file in files:
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename}: File must be an image (JPG, PNG, etc.)"
+            )
+        content = await read_upload(file)
+        if len(content) == 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename}: Empty file uploaded"
+            )
+        total_size += len(content)
+        if total_size > MAX_BATCH_TOTAL_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail="Batch too large. Maximum total size is 50MB"
+            )
+        if sniff_image_format(content) is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename}: Invalid image file. Please upload a valid image."
+            )
+        contents.append(content)
+    
+    try:
+        _, session = await asyncio.to_thread(get_rembg, model)
+        
+        async with inference_semaphore:
+            try:
+                outputs = await asyncio.to_thread(process_batch, contents, session, model)
+            except InvalidImageError as e:
+                logger.error("Invalid image file: %s", e)
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid image file. Please upload a valid image."
+                )
+        
+        logger.info("Batch background removal completed successfully")
+        
+        body, media_type = multipart_mixed(
+            (f"no_bg_{file.filename or 'image'}.png", output)
+            for file, output in zip(files, outputs)
+        )
+        return Response(content=body, media_type=media_type)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error processing batch: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing images: {str(e)}"
+        )
+
 # Run the app directly
 if __name__ == "__main__":
     import uvicorn
@@ -151,5 +761,7 @@ if __name__ == "__main__":
         app,
         host=host,
         port=port,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -0,0 +1,90 @@
+"""
+Statically quantize a rembg u2net/u2netp model to INT8 (QDQ format).
+
+Calibration runs on real images preprocessed exactly like rembg does
+(320x320, ImageNet mean/std). Sigmoid/Softmax nodes stay in FP32.
+Run fix_shapes.py first and pass its output to get <model>_fixed_int8.onnx.
+
+Usage:
+    python quantize.py path/to/calibration/images [--model ~/.u2net/u2netp_fixed.onnx]
+"""
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from PIL import Image
+
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+INPUT_SIZE = (320, 320)
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def preprocess(path):
+    """Load an image and normalize it the same way rembg's u2net session does"""
+    with Image.open(path) as img:
+        im = img.convert("RGB").resize(INPUT_SIZE, Image.Resampling.LANCZOS)
+
+    im_ary = np.array(im, dtype=np.float32)
+    im_ary = im_ary / max(float(np.max(im_ary)), 1.0)
+    im_ary = (im_ary - np.array(MEAN, dtype=np.float32)) / np.array(STD, dtype=np.float32)
+
+    return np.expand_dims(im_ary.transpose((2, 0, 1)), 0).astype(np.float32)
+
+
+class U2netCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed calibration images to the quantizer"""
+
+    def __init__(self, image_paths, input_name):
+        self._batches = ({input_name: preprocess(p)} for p in image_paths)
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+def main():
+    u2net_home = os.path.expanduser(os.environ.get("U2NET_HOME", "~/.u2net"))
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("images", help="Directory of calibration images")
+    parser.add_argument("--model", default=os.path.join(u2net_home, "u2netp.onnx"))
+    parser.add_argument("--output", help="Defaults to <model>_int8.onnx")
+    parser.add_argument("--num-images", type=int, default=100)
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + "_int8.onnx"
+
+    image_paths = sorted(
+        p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES
+    )[: args.num_images]
+    if not image_paths:
+        raise SystemExit(f"No calibration images found in {args.images}")
+
+    model = onnx.load(args.model)
+    input_name = model.graph.input[0].name
+    excluded = [n.name for n in model.graph.node if n.op_type in ("Sigmoid", "Softmax")]
+
+    print(f"Calibrating on {len(image_paths)} images, keeping {len(excluded)} nodes in FP32")
+    quantize_static(
+        args.model,
+        output,
+        U2netCalibrationReader(image_paths, input_name),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        nodes_to_exclude=excluded,
+    )
+    print(f"Saved INT8 model to {output}")
+
+
+if __name__ == "__main__":
+    main()
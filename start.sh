@@ -0,0 +1,37 @@
+#!/bin/sh
+# Put the CUDA wheel libraries from requirements-gpu.txt on the path for the
+# CUDA EP; CPU-only installs don't have them
+CUDA_LIBS="$(python -c '
+import importlib
+paths = []
+for name in ("cuda_runtime", "cublas", "cudnn", "cufft", "curand"):
+    try:
+        paths.append(importlib.import_module(f"nvidia.{name}.lib").__path__[0])
+    except ImportError:
+        pass
+print(":".join(paths))
+' 2>/dev/null)"
+if [ -n "$CUDA_LIBS" ]; then
+    export LD_LIBRARY_PATH="${CUDA_LIBS}${LD_LIBRARY_PATH:+:$LD_LIBRARY_PATH}"
+fi
+
+# jemalloc returns freed memory to the OS more eagerly than glibc malloc
+# (apt install libjemalloc2)
+JEMALLOC=/usr/lib/x86_64-linux-gnu/libjemalloc.so.2
+if [ -f "$JEMALLOC" ]; then
+    export LD_PRELOAD="$JEMALLOC${LD_PRELOAD:+:$LD_PRELOAD}"
+fi
+
+# gunicorn reads the worker count from WEB_CONCURRENCY, main.py uses it to
+# split the CPU between workers. Inference is CPU-bound and each worker loads
+# its own model and result cache, so default to one worker per core.
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-$(nproc)}"
+
+# UvicornWorker doesn't heartbeat while the startup event loads and warms
+# the model, so the worker timeout has to cover a cold model download
+exec gunicorn main:app \
+    -k uvicorn.workers.UvicornWorker \
+    --bind "0.0.0.0:${PORT:-8000}" \
+    --timeout "${GUNICORN_TIMEOUT:-300}" \
+    --graceful-timeout "${GUNICORN_GRACEFUL_TIMEOUT:-60}" \
+    --preload
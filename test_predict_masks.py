@@ -0,0 +1,30 @@
+"""
+The batch endpoint reimplements rembg's preprocessing in predict_masks, so
+check that it still gives the same mask as each model's own session.predict().
+
+Downloads the models to U2NET_HOME on first run.
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+
+@pytest.mark.parametrize("model_name", main.SUPPORTED_MODELS)
+def test_predict_masks_matches_rembg(model_name):
+    session = main.create_session(model_name)
+
+    # Square so predict_masks adds no padding, but not the input size so
+    # both sides resize
+    size = main.MODEL_INPUTS[model_name][2] * 3 // 2
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), "RGB")
+
+    expected = session.predict(img)[0]
+    (mask,) = main.predict_masks(session, [img], model_name)
+    # rembg scales its mask back to the input size
+    mask = mask.resize(img.size, Image.LANCZOS)
+
+    diff = np.abs(np.asarray(mask, dtype=np.int16) - np.asarray(expected, dtype=np.int16))
+    assert diff.max() <= 1